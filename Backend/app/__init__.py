@@ -1,24 +1,64 @@
-from flask import Flask
+import orjson
+from flask import Flask, jsonify
+from flask.json.provider import JSONProvider
 from flask_pymongo import PyMongo
 from flask_cors import CORS
 from flask_bcrypt import Bcrypt
 from flask_jwt_extended import JWTManager
+from flask_limiter import Limiter
+from flask_limiter.util import get_remote_address
+from werkzeug.middleware.proxy_fix import ProxyFix
 from config import Config
 
 mongo = PyMongo()
 bcrypt = Bcrypt()
 jwt = JWTManager()
+limiter = Limiter(key_func=get_remote_address)
+
+
+class ORJSONProvider(JSONProvider):
+    """JSON provider backed by orjson; unknown types (ObjectId) fall back to str."""
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=str, option=orjson.OPT_NON_STR_KEYS).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
 
 
 def create_app(config_class=Config):
     app = Flask(__name__)
     app.config.from_object(config_class)
 
-    mongo.init_app(app)
+    # Behind a reverse proxy, take the client address from X-Forwarded-For so
+    # rate limits are per client rather than one bucket for the proxy
+    if app.config['PROXY_FIX_X_FOR']:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['PROXY_FIX_X_FOR'])
+
+    # connect=False defers the handshake to the first query so forked
+    # Gunicorn workers each open their own pool
+    mongo.init_app(
+        app,
+        connect=False,
+        maxPoolSize=app.config['MONGO_MAX_POOL_SIZE'],
+        minPoolSize=app.config['MONGO_MIN_POOL_SIZE'],
+        maxIdleTimeMS=app.config['MONGO_MAX_IDLE_TIME_MS'],
+        serverSelectionTimeoutMS=app.config['MONGO_SERVER_SELECTION_TIMEOUT_MS']
+    )
+    # Set after PyMongo, which installs its own BSON provider in init_app
+    app.json = ORJSONProvider(app)
     bcrypt.init_app(app)
     jwt.init_app(app)
+    limiter.init_app(app)
     CORS(app, supports_credentials=True)
 
+    from utils.passwords import init_password_hasher
+    init_password_hasher(app)
+
+    @app.errorhandler(429)
+    def rate_limited(e):
+        return jsonify({'error': 'Too many attempts, please try again later'}), 429
+
     from routes.auth import auth_bp
     from routes.typing import typing_bp
     
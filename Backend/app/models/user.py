@@ -1,4 +1,4 @@
-from app import bcrypt
+from utils.passwords import hash_password, verify_password
 from datetime import datetime
 from bson import ObjectId
 
@@ -40,10 +40,10 @@ class User:
         }
     
     def set_password(self, password):
-        self.password_hash = bcrypt.generate_password_hash(password).decode('utf-8')
+        self.password_hash = hash_password(password)
     
     def check_password(self, password):
-        return bcrypt.check_password_hash(self.password_hash, password)
+        return verify_password(self.password_hash, password)[0]
     
     def get_best_wpm(self, mongo_db, mode='time', mode_value=60):
         result = mongo_db.typing_results.find_one(
@@ -68,6 +68,27 @@ class User:
         result = list(mongo_db.typing_results.aggregate(pipeline))
         return round(result[0]['avg_accuracy'], 2) if result else 0
     
+    def get_stats(self, mongo_db, mode='time', mode_value=60):
+        """Best WPM for mode/mode_value plus overall averages, in one aggregation."""
+        is_mode = {'$and': [{'$eq': ['$mode', mode]}, {'$eq': ['$mode_value', mode_value]}]}
+        pipeline = [
+            {'$match': {'user_id': self._id}},
+            {'$group': {
+                '_id': None,
+                'best_wpm': {'$max': {'$cond': [is_mode, '$wpm', None]}},
+                'avg_wpm': {'$avg': '$wpm'},
+                'avg_accuracy': {'$avg': '$accuracy'}
+            }}
+        ]
+        result = next(mongo_db.typing_results.aggregate(pipeline), None)
+        if not result:
+            return {'best_wpm': 0, 'average_wpm': 0, 'average_accuracy': 0}
+        return {
+            'best_wpm': result['best_wpm'] or 0,
+            'average_wpm': round(result['avg_wpm'] or 0, 2),
+            'average_accuracy': round(result['avg_accuracy'] or 0, 2)
+        }
+    
     def to_dict(self, mongo_db=None):
         data = {
             'id': str(self._id),
@@ -77,10 +98,8 @@ class User:
             'tests_completed': self.tests_completed,
             'tests_started': self.tests_started,
         }
-        if mongo_db:
-            data['best_wpm'] = self.get_best_wpm(mongo_db)
-            data['average_wpm'] = self.get_average_wpm(mongo_db)
-            data['average_accuracy'] = self.get_average_accuracy(mongo_db)
+        if mongo_db is not None:
+            data.update(self.get_stats(mongo_db))
         else:
             data['best_wpm'] = 0
             data['average_wpm'] = 0
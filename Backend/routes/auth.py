@@ -1,14 +1,22 @@
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import create_access_token, create_refresh_token, jwt_required, get_jwt_identity
-from app import mongo, bcrypt
+from flask_jwt_extended import create_access_token, create_refresh_token, jwt_required, get_jwt_identity, get_jwt
+from app import mongo, limiter
 from bson import ObjectId
+from pymongo import ReturnDocument
 from datetime import datetime
-from utils.helpers import format_user
+from utils.helpers import format_user, run_blocking, USER_FIELDS
+from utils.passwords import hash_password, verify_password, dummy_password_hash
 
 auth_bp = Blueprint('auth', __name__, url_prefix='/api/auth')
 
+# Login needs the hash to verify plus what format_user returns
+LOGIN_FIELDS = {**USER_FIELDS, 'password_hash': 1}
+
 
 @auth_bp.route('/register', methods=['POST'])
+# Only successful sign-ups count, so rejected (400/409) attempts that never
+# reach the password hash don't lock the client out
+@limiter.limit('3 per hour;20 per day', deduct_when=lambda response: response.status_code == 201)
 def register():
     data = request.get_json()
     
@@ -28,13 +36,16 @@ def register():
     if len(password) < 6:
         return jsonify({'error': 'Password must be at least 6 characters'}), 400
     
-    if mongo.db.users.find_one({'username': username}):
-        return jsonify({'error': 'Username already exists'}), 409
-    
-    if mongo.db.users.find_one({'email': email}):
+    existing = mongo.db.users.find_one(
+        {'$or': [{'username': username}, {'email': email}]},
+        {'username': 1}
+    )
+    if existing:
+        if existing['username'] == username:
+            return jsonify({'error': 'Username already exists'}), 409
         return jsonify({'error': 'Email already registered'}), 409
     
-    password_hash = bcrypt.generate_password_hash(password).decode('utf-8')
+    password_hash = run_blocking(hash_password, password)
     
     user = {
         'username': username,
@@ -48,8 +59,10 @@ def register():
     result = mongo.db.users.insert_one(user)
     user['_id'] = result.inserted_id
     
-    access_token = create_access_token(identity=str(user['_id']))
-    refresh_token = create_refresh_token(identity=str(user['_id']))
+    # Carry the username in the tokens so read endpoints can skip a user lookup
+    claims = {'username': user['username']}
+    access_token = create_access_token(identity=str(user['_id']), additional_claims=claims)
+    refresh_token = create_refresh_token(identity=str(user['_id']), additional_claims=claims)
     
     return jsonify({
         'message': 'User registered successfully',
@@ -60,6 +73,7 @@ def register():
 
 
 @auth_bp.route('/login', methods=['POST'])
+@limiter.limit('5 per minute')
 def login():
     data = request.get_json()
     
@@ -72,13 +86,27 @@ def login():
     if not all([username, password]):
         return jsonify({'error': 'Missing username or password'}), 400
     
-    user = mongo.db.users.find_one({'username': username})
+    user = mongo.db.users.find_one({'username': username}, LOGIN_FIELDS)
     
-    if not user or not bcrypt.check_password_hash(user['password_hash'], password):
+    if not user:
+        run_blocking(verify_password, dummy_password_hash(), password)
         return jsonify({'error': 'Invalid username or password'}), 401
     
-    access_token = create_access_token(identity=str(user['_id']))
-    refresh_token = create_refresh_token(identity=str(user['_id']))
+    valid, needs_rehash = run_blocking(verify_password, user['password_hash'], password)
+    if not valid:
+        return jsonify({'error': 'Invalid username or password'}), 401
+    
+    # Upgrade legacy bcrypt (or outdated Argon2) hashes while we have the password
+    if needs_rehash:
+        mongo.db.users.update_one(
+            {'_id': user['_id']},
+            {'$set': {'password_hash': run_blocking(hash_password, password)}}
+        )
+    
+    # Carry the username in the tokens so read endpoints can skip a user lookup
+    claims = {'username': user['username']}
+    access_token = create_access_token(identity=str(user['_id']), additional_claims=claims)
+    refresh_token = create_refresh_token(identity=str(user['_id']), additional_claims=claims)
     
     return jsonify({
         'message': 'Login successful',
@@ -92,15 +120,17 @@ def login():
 @jwt_required(refresh=True)
 def refresh():
     identity = get_jwt_identity()
-    access_token = create_access_token(identity=identity)
+    username = get_jwt().get('username')
+    claims = {'username': username} if username else None
+    access_token = create_access_token(identity=identity, additional_claims=claims)
     return jsonify({'access_token': access_token}), 200
 
 
 @auth_bp.route('/me', methods=['GET'])
 @jwt_required()
 def get_current_user():
-    user_id = get_jwt_identity()
-    user = mongo.db.users.find_one({'_id': ObjectId(user_id)})
+    user_id = ObjectId(get_jwt_identity())
+    user = mongo.db.users.find_one({'_id': user_id}, USER_FIELDS)
     
     if not user:
         return jsonify({'error': 'User not found'}), 404
@@ -111,29 +141,34 @@ def get_current_user():
 @auth_bp.route('/me', methods=['PUT'])
 @jwt_required()
 def update_user():
-    user_id = get_jwt_identity()
-    user = mongo.db.users.find_one({'_id': ObjectId(user_id)})
-    
-    if not user:
-        return jsonify({'error': 'User not found'}), 404
-    
-    data = request.get_json()
+    user_id = ObjectId(get_jwt_identity())
+    data = request.get_json() or {}
     update_data = {}
     
     if 'email' in data:
-        existing = mongo.db.users.find_one({'email': data['email']})
-        if existing and str(existing['_id']) != user_id:
+        existing = mongo.db.users.find_one({'email': data['email']}, {'_id': 1})
+        if existing and existing['_id'] != user_id:
             return jsonify({'error': 'Email already in use'}), 409
         update_data['email'] = data['email']
     
     if 'password' in data:
         if len(data['password']) < 6:
             return jsonify({'error': 'Password must be at least 6 characters'}), 400
-        update_data['password_hash'] = bcrypt.generate_password_hash(data['password']).decode('utf-8')
+        update_data['password_hash'] = run_blocking(hash_password, data['password'])
     
+    # Apply the update and read back the result in one round-trip; a missing
+    # user shows up as None either way
     if update_data:
-        mongo.db.users.update_one({'_id': ObjectId(user_id)}, {'$set': update_data})
+        user = mongo.db.users.find_one_and_update(
+            {'_id': user_id},
+            {'$set': update_data},
+            projection=USER_FIELDS,
+            return_document=ReturnDocument.AFTER
+        )
+    else:
+        user = mongo.db.users.find_one({'_id': user_id}, USER_FIELDS)
     
-    user = mongo.db.users.find_one({'_id': ObjectId(user_id)})
+    if not user:
+        return jsonify({'error': 'User not found'}), 404
     
     return jsonify({'user': format_user(user)}), 200
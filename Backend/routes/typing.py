@@ -1,19 +1,201 @@
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
 from app import mongo
 from bson import ObjectId
+from bson.errors import InvalidId
+from collections import Counter
+from pymongo import ReturnDocument
 from datetime import datetime
-from utils.helpers import format_result
+from utils.helpers import format_result, RESULT_FIELDS
+import hashlib
+import orjson
+import requests
+from requests.adapters import HTTPAdapter
 import random
 import os
+import re
+import time
+import logging
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
 typing_bp = Blueprint('typing', __name__, url_prefix='/api/typing')
+logger = logging.getLogger(__name__)
 
 SUPPORTED_LANGUAGES = ['python', 'javascript', 'typescript', 'rust', 'go', 'c', 'cpp']
+SUPPORTED_LANGUAGE_SET = frozenset(SUPPORTED_LANGUAGES)
+UNSUPPORTED_LANGUAGE_ERROR = f'Unsupported language. Choose from: {SUPPORTED_LANGUAGES}'
+
+# Upper bound on the history count; past this the total is reported as an estimate
+RESULTS_COUNT_CAP = 10000
+
+# Fields a POST /result body must carry
+REQUIRED_RESULT_FIELDS = ('mode', 'wpm', 'raw_wpm', 'accuracy',
+                          'correct_chars', 'incorrect_chars', 'test_duration')
+REQUIRED_RESULT_FIELD_SET = frozenset(REQUIRED_RESULT_FIELDS)
+
+# Largest history page a client may request; bounds per-request memory and payload size
+MAX_RESULTS_PER_PAGE = 100
+
+# MongoDB field names can't contain '.' or '$' operators, but client-supplied
+# pairs and words do (e.g. "f." or "self." in code mode); store them with
+# look-alike characters and map back when reading
+FIELD_KEY_ESCAPES = str.maketrans({'.': '\uff0e', '$': '\uff04'})
+FIELD_KEY_UNESCAPES = str.maketrans({'\uff0e': '.', '\uff04': '$'})
+
+# Non-whitespace characters, i.e. valid Vim target positions
+NON_WHITESPACE_RE = re.compile(r'\S')
+
+# AI generations are pooled per request shape: new ones are generated until a
+# pool is full, then served from it at random until they expire
+VIM_CHALLENGE_POOL_SIZE = 8
+VIM_CHALLENGE_TTL = 600  # seconds
+TYPING_CODE_POOL_SIZE = 50
+TYPING_CODE_TTL = 3600  # seconds
+AI_MAX_POOLS = 256
+_ai_pools = {}
+
+# Compact motion reference sent with every Vim challenge prompt
+VIM_MOTION_RULES = """- j/k: vertical, column kept (clamped to line length); h/l: one char
+- w/b/e: next word start / previous word start / word end
+- 0/$/^: line start / line end / first non-blank
+- f/F/t/T{char}: find / till char forward / backward
+- gg/G/{n}G: first / last / nth line; { / }: previous / next blank line; %: matching bracket
+- Count prefixes: 5j, 3w"""
+
+# Prompt hints that steer Vim challenge targets toward a user's weak motions
+WEAKNESS_HINTS = {
+    'slow_basic_movement': 'Include targets that require precise h/j/k/l movements (1-3 steps)',
+    'missing_word_motions': 'Include targets at word boundaries that can be reached with w, b, e motions',
+    'missing_find_motions': 'Include targets on characters that can be reached with f{char} or t{char}',
+    'missing_line_motions': 'Include targets at line start (0), first non-blank (^), or line end ($)',
+    'missing_count_prefix': 'Include targets that require count prefixes like 5j or 3w',
+    'missing_paragraph_motions': 'Include targets after blank lines that can be reached with { or }',
+    'missing_bracket_matching': 'Include targets on matching brackets that can be reached with %',
+}
+WEAKNESS_HINT_BULLETS = {k: f'- {hint}' for k, hint in WEAKNESS_HINTS.items()}
+
+# Prompt templates for AI generations; only the per-request fields are filled in
+VIM_CHALLENGE_PROMPT = """Vim navigation challenge for {language}: a 5-8 line code snippet and EXACTLY {target_count} targets.
+Cursor starts at line 0, col 0; positions are 0-indexed.
+
+Motions:
+{motion_rules}{weakness_focus}
+
+Respond with ONLY compact JSON (no whitespace outside strings), e.g.
+{{"code":"<snippet, \\n between lines>","targets":[{{"line":0,"col":5,"optimal_keys":"5l","description":"Move 5 characters right"}}]}}
+
+Rules:
+- EXACTLY {target_count} targets, each on a non-whitespace character (col 0 to line_length-1)
+- Each target is reached from the previous one with the most efficient keys, not h/j/k/l spam
+- Use a variety of motion types"""
+
+# Subjects and themes picked at random so generated typing code varies
+TYPING_CODE_TYPES = (
+    "a function that spreads chaos",
+    "a class for orchestrating evil schemes",
+    "an API endpoint for world destruction",
+    "a utility function with malicious intent",
+    "a data corruption function",
+    "a sabotage algorithm",
+    "a file destruction function",
+    "a chaos query helper",
+    "a manipulation utility",
+    "a devastation calculator",
+    "a recursive doom function",
+    "a function using dark comprehensions",
+    "a conspiracy configuration parser",
+    "a cursed cache implementation",
+    "a treacherous validation function",
+)
+
+TYPING_CODE_THEMES = (
+    "world domination system", "chaos engine", "destruction protocol", "cursed deployment",
+    "data corruption", "system sabotage", "evil scheme tracker", "villain database",
+    "mayhem generator", "anarchy manager", "dark ritual handler", "corruption spreader",
+    "betrayal logger", "manipulation framework", "terror campaign", "devastation planner",
+)
+
+TYPING_CODE_PROMPT = """Generate a unique {language} code snippet for typing practice.
+
+Create {code_type} related to {theme}.
+
+Requirements:
+- Generate 8-12 lines of realistic, properly formatted {language} code
+- Use proper indentation and formatting
+- Make it look like real production code
+- Include a variety of syntax elements (brackets, operators, strings, etc.)
+- Make this snippet DIFFERENT from typical examples - be creative!
+
+Return ONLY valid JSON in this exact format:
+{{
+  "lines": [
+    "line 1 of code",
+    "line 2 of code",
+    "..."
+  ]
+}}
+
+Make sure:
+- Each line is a separate string in the array
+- Preserve exact indentation with spaces (not tabs)
+- No trailing whitespace
+- Code is syntactically correct and idiomatic for {language}
+- Be creative and generate something unique!"""
+
+# Structured-output schema for Vim challenges, so replies always parse
+VIM_CHALLENGE_RESPONSE_FORMAT = {
+    'type': 'json_schema',
+    'json_schema': {
+        'name': 'vim_challenge',
+        'strict': True,
+        'schema': {
+            'type': 'object',
+            'properties': {
+                'code': {'type': 'string'},
+                'targets': {
+                    'type': 'array',
+                    'items': {
+                        'type': 'object',
+                        'properties': {
+                            'line': {'type': 'integer'},
+                            'col': {'type': 'integer'},
+                            'optimal_keys': {'type': 'string'},
+                            'description': {'type': 'string'}
+                        },
+                        'required': ['line', 'col', 'optimal_keys', 'description'],
+                        'additionalProperties': False
+                    }
+                }
+            },
+            'required': ['code', 'targets'],
+            'additionalProperties': False
+        }
+    }
+}
+
+# Structured-output schema for generated typing code
+TYPING_CODE_RESPONSE_FORMAT = {
+    'type': 'json_schema',
+    'json_schema': {
+        'name': 'typing_code',
+        'strict': True,
+        'schema': {
+            'type': 'object',
+            'properties': {
+                'lines': {'type': 'array', 'items': {'type': 'string'}}
+            },
+            'required': ['lines'],
+            'additionalProperties': False
+        }
+    }
+}
+
+
+# Shared OpenAI client so generations reuse one pooled HTTP connection
+_openai_client = None
 
 
 def get_openai_key():
@@ -21,84 +203,50 @@ def get_openai_key():
     return os.environ.get('OPENAI_API_KEY')
 
 
-def generate_vim_challenge(language: str, target_count: int = 5, weaknesses: list = None) -> dict | None:
-    """Generate a code snippet with Vim navigation challenges and optimal solutions."""
+def get_openai_client():
+    """Return the shared OpenAI client, rebuilding it if the API key changed."""
+    global _openai_client
     api_key = get_openai_key()
     if not api_key:
-        print("No OpenAI API key found")
         return None
     
-    try:
+    if _openai_client is None or _openai_client.api_key != api_key:
+        import httpx
         from openai import OpenAI
-        import json
-        client = OpenAI(api_key=api_key)
-        
+        # Bounded timeouts so a hung upstream can't pin a worker; keep-alive
+        # sockets are shared across requests, and HTTP/2 lets concurrent
+        # generations multiplex over one of them
+        http_client = httpx.Client(
+            http2=True,
+            timeout=httpx.Timeout(20.0, connect=5.0),
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20)
+        )
+        _openai_client = OpenAI(api_key=api_key, http_client=http_client, max_retries=2)
+    return _openai_client
+
+
+def generate_vim_challenge(language: str, target_count: int = 5, weaknesses: list = None) -> dict | None:
+    """Generate a code snippet with Vim navigation challenges and optimal solutions."""
+    client = get_openai_client()
+    if not client:
+        logger.warning("No OpenAI API key found")
+        return None
+    
+    try:
         weakness_focus = ""
         if weaknesses:
-            weakness_hints = {
-                'slow_basic_movement': 'Include targets that require precise h/j/k/l movements (1-3 steps)',
-                'missing_word_motions': 'Include targets at word boundaries that can be reached with w, b, e motions',
-                'missing_find_motions': 'Include targets on characters that can be reached with f{char} or t{char}',
-                'missing_line_motions': 'Include targets at line start (0), first non-blank (^), or line end ($)',
-                'missing_count_prefix': 'Include targets that require count prefixes like 5j or 3w',
-                'missing_paragraph_motions': 'Include targets after blank lines that can be reached with { or }',
-                'missing_bracket_matching': 'Include targets on matching brackets that can be reached with %',
-            }
-            focus_items = [weakness_hints.get(w, '') for w in weaknesses if w in weakness_hints]
+            focus_items = [WEAKNESS_HINT_BULLETS[w] for w in weaknesses if w in WEAKNESS_HINT_BULLETS]
             if focus_items:
-                weakness_focus = "\n\nFOCUS ON THESE VIM SKILLS:\n" + "\n".join(f"- {item}" for item in focus_items[:3])
+                weakness_focus = "\n\nFOCUS ON THESE VIM SKILLS:\n" + "\n".join(focus_items[:3])
         
-        prompt = f"""Generate a Vim navigation challenge for {language} code.
-
-Create a short code snippet (5-8 lines) and EXACTLY {target_count} navigation targets.
-The cursor starts at line 0, column 0.
-
-For each target, provide:
-1. The target position (line and column, 0-indexed)
-2. The optimal Vim keystrokes to reach it from the previous position
-3. A description of the optimal motion
-
-IMPORTANT VIM MOTION RULES:
-- j/k move vertically, cursor column is preserved (or clamped to line length)
-- h/l move horizontally one character
-- w = next word start, b = previous word start, e = end of word
-- 0 = line start, $ = line end, ^ = first non-blank
-- f{{char}} = find char forward, F{{char}} = find char backward
-- t{{char}} = till char forward, T{{char}} = till char backward
-- gg = first line, G = last line, {{n}}G = go to line n
-- {{ = previous blank line, }} = next blank line
-- % = matching bracket
-- Count prefixes work: 5j = move 5 lines down, 3w = move 3 words forward
-{weakness_focus}
-
-Respond with ONLY valid JSON in this exact format:
-{{
-  "code": "the code snippet as a single string with \\n for newlines",
-  "targets": [
-    {{
-      "line": 0,
-      "col": 5,
-      "optimal_keys": "5l",
-      "description": "Move 5 characters right"
-    }},
-    {{
-      "line": 2,
-      "col": 0,
-      "optimal_keys": "2j0",
-      "description": "Move 2 lines down, go to line start"
-    }}
-  ]
-}}
+        prompt = VIM_CHALLENGE_PROMPT.format(
+            language=language,
+            target_count=target_count,
+            motion_rules=VIM_MOTION_RULES,
+            weakness_focus=weakness_focus
+        )
 
-Make sure:
-- EXACTLY {target_count} targets in the targets array (this is critical!)
-- Targets are on actual characters in the code (not whitespace at end of lines)
-- Each target is reachable from the previous target's position
-- Optimal solutions use efficient Vim motions, not just h/j/k/l spam
-- Column positions are valid (0 to line_length-1)
-- Include a variety of motion types"""
-
-        print(f"Generating Vim challenge for {language}...")
+        logger.debug("Generating Vim challenge for %s", language)
         response = client.chat.completions.create(
             model="gpt-4o-mini",
             messages=[
@@ -106,22 +254,17 @@ Make sure:
                 {"role": "user", "content": prompt}
             ],
             max_tokens=1000,
-            temperature=0.7
+            temperature=0.7,
+            response_format=VIM_CHALLENGE_RESPONSE_FORMAT
         )
         
-        content = response.choices[0].message.content.strip()
-        
-        # Remove markdown code blocks if present
-        if content.startswith('```'):
-            lines = content.split('\n')
-            content = '\n'.join(lines[1:-1] if lines[-1].startswith('```') else lines[1:])
-        
-        # Parse JSON
-        result = json.loads(content)
+        # Structured output guarantees schema-shaped JSON; content is None on refusal
+        content = response.choices[0].message.content or ''
+        result = orjson.loads(content)
         
         # Validate the response
         if 'code' not in result or 'targets' not in result:
-            print("Invalid response structure")
+            logger.warning("Invalid response structure")
             return None
         
         code_lines = result['code'].split('\n')
@@ -143,7 +286,7 @@ Make sure:
                     })
         
         if len(validated_targets) < 2:
-            print("Not enough valid targets")
+            logger.warning("Not enough valid targets")
             return None
         
         # Ensure we have exactly the requested number of targets
@@ -153,22 +296,18 @@ Make sure:
         
         # If AI gave us fewer valid targets, generate additional random targets
         if len(validated_targets) < target_count:
-            # Find all valid positions (non-whitespace)
-            all_positions = []
-            for line_idx, line in enumerate(code_lines):
-                for col_idx, char in enumerate(line):
-                    if not char.isspace():
-                        all_positions.append((line_idx, col_idx))
-            
-            # Remove positions we already have
+            # Valid (non-whitespace) positions we don't already target
             existing = {(t['position']['line'], t['position']['col']) for t in validated_targets}
-            available = [p for p in all_positions if p not in existing]
+            available = {
+                (line_idx, match.start())
+                for line_idx, line in enumerate(code_lines)
+                for match in NON_WHITESPACE_RE.finditer(line)
+            } - existing
             
-            import random
-            random.shuffle(available)
+            # Sort first so the sample doesn't depend on set iteration order
+            picks = random.sample(sorted(available), min(target_count - len(validated_targets), len(available)))
             
-            while len(validated_targets) < target_count and available:
-                line_idx, col_idx = available.pop()
+            for line_idx, col_idx in picks:
                 validated_targets.append({
                     'position': {'line': line_idx, 'col': col_idx},
                     'optimal_keys': '',  # Will need to be computed client-side
@@ -176,7 +315,7 @@ Make sure:
                     'completed': False
                 })
         
-        print(f"Generated {len(validated_targets)} valid targets (requested {target_count})")
+        logger.debug("Generated %d valid targets (requested %d)", len(validated_targets), target_count)
         return {
             'code': result['code'],
             'lines': code_lines,
@@ -184,17 +323,37 @@ Make sure:
             'ai_generated': True
         }
         
-    except json.JSONDecodeError as e:
-        print(f"JSON parsing failed: {e}")
-        print(f"Content was: {content[:200]}...")
+    except orjson.JSONDecodeError as e:
+        logger.warning("JSON parsing failed: %s; content was: %.200s", e, content)
         return None
-    except Exception as e:
-        import traceback
-        print(f"Vim challenge generation failed: {e}")
-        traceback.print_exc()
+    except Exception:
+        logger.exception("Vim challenge generation failed")
         return None
 
 
+def get_pooled(key: tuple, pool_size: int, ttl: int, generate, *args) -> dict | None:
+    """Serve a generated item from the pool for key, calling generate(*args) while it fills."""
+    now = time.monotonic()
+    pool = _ai_pools.get(key)
+    if pool is not None:
+        pool[:] = [entry for entry in pool if now - entry[0] < ttl]
+        if len(pool) >= pool_size:
+            return random.choice(pool)[1]
+    
+    item = generate(*args)
+    if item:
+        # generate() waits on OpenAI, so other greenlets may have filled or
+        # evicted this pool meanwhile; add to the live list, not the one read above
+        now = time.monotonic()
+        if key not in _ai_pools and len(_ai_pools) >= AI_MAX_POOLS:
+            # Evict the oldest pool (dicts keep insertion order)
+            _ai_pools.pop(next(iter(_ai_pools)))
+        pool = _ai_pools.setdefault(key, [])
+        pool[:] = [entry for entry in pool if now - entry[0] < ttl]
+        pool.append((now, item))
+    return item
+
+
 @typing_bp.route('/vim-challenge', methods=['POST'])
 def get_vim_challenge():
     """Generate a Vim navigation challenge with AI-generated optimal solutions."""
@@ -206,13 +365,21 @@ def get_vim_challenge():
     target_count = data.get('target_count', 5)
     weaknesses = data.get('weaknesses', [])
     
-    if language not in SUPPORTED_LANGUAGES:
-        return jsonify({'error': f'Unsupported language. Choose from: {SUPPORTED_LANGUAGES}'}), 400
+    if language not in SUPPORTED_LANGUAGE_SET:
+        return jsonify({'error': UNSUPPORTED_LANGUAGE_ERROR}), 400
     
     # Clamp target count
     target_count = max(3, min(10, target_count))
     
-    challenge = generate_vim_challenge(language, target_count, weaknesses)
+    # Key on exactly what reaches the prompt (the first three hinted weaknesses,
+    # in order) so users with the same focus share a pool and arbitrary strings
+    # can't mint new pools that evict everyone else's
+    if not isinstance(weaknesses, list):
+        weaknesses = []
+    focus = tuple([w for w in weaknesses if isinstance(w, str) and w in WEAKNESS_HINT_BULLETS][:3])
+    key = ('vim', language, target_count, focus)
+    challenge = get_pooled(key, VIM_CHALLENGE_POOL_SIZE, VIM_CHALLENGE_TTL,
+                           generate_vim_challenge, language, target_count, list(focus))
     
     if not challenge:
         return jsonify({'error': 'Failed to generate Vim challenge'}), 500
@@ -229,74 +396,19 @@ def get_vim_challenge():
 
 def generate_typing_code(language: str) -> dict | None:
     """Generate code snippets for typing practice."""
-    api_key = get_openai_key()
-    if not api_key:
-        print("No OpenAI API key found")
+    client = get_openai_client()
+    if not client:
+        logger.warning("No OpenAI API key found")
         return None
     
     try:
-        from openai import OpenAI
-        import json
-        import random
-        client = OpenAI(api_key=api_key)
-        
         # Randomize the type of code to generate
-        code_types = [
-            "a function that spreads chaos",
-            "a class for orchestrating evil schemes",
-            "an API endpoint for world destruction",
-            "a utility function with malicious intent",
-            "a data corruption function",
-            "a sabotage algorithm",
-            "a file destruction function",
-            "a chaos query helper",
-            "a manipulation utility",
-            "a devastation calculator",
-            "a recursive doom function",
-            "a function using dark comprehensions",
-            "a conspiracy configuration parser",
-            "a cursed cache implementation",
-            "a treacherous validation function",
-        ]
+        code_type = random.choice(TYPING_CODE_TYPES)
+        theme = random.choice(TYPING_CODE_THEMES)
         
-        themes = [
-            "world domination system", "chaos engine", "destruction protocol", "cursed deployment",
-            "data corruption", "system sabotage", "evil scheme tracker", "villain database",
-            "mayhem generator", "anarchy manager", "dark ritual handler", "corruption spreader",
-            "betrayal logger", "manipulation framework", "terror campaign", "devastation planner",
-        ]
-        
-        code_type = random.choice(code_types)
-        theme = random.choice(themes)
-        
-        prompt = f"""Generate a unique {language} code snippet for typing practice.
-
-Create {code_type} related to {theme}.
-
-Requirements:
-- Generate 8-12 lines of realistic, properly formatted {language} code
-- Use proper indentation and formatting
-- Make it look like real production code
-- Include a variety of syntax elements (brackets, operators, strings, etc.)
-- Make this snippet DIFFERENT from typical examples - be creative!
-
-Return ONLY valid JSON in this exact format:
-{{
-  "lines": [
-    "line 1 of code",
-    "line 2 of code",
-    "..."
-  ]
-}}
+        prompt = TYPING_CODE_PROMPT.format(language=language, code_type=code_type, theme=theme)
 
-Make sure:
-- Each line is a separate string in the array
-- Preserve exact indentation with spaces (not tabs)
-- No trailing whitespace
-- Code is syntactically correct and idiomatic for {language}
-- Be creative and generate something unique!"""
-
-        print(f"Generating typing code for {language} ({code_type} - {theme})...")
+        logger.debug("Generating typing code for %s (%s - %s)", language, code_type, theme)
         response = client.chat.completions.create(
             model="gpt-4o-mini",
             messages=[
@@ -304,20 +416,15 @@ Make sure:
                 {"role": "user", "content": prompt}
             ],
             max_tokens=800,
-            temperature=1.0
+            temperature=1.0,
+            response_format=TYPING_CODE_RESPONSE_FORMAT
         )
         
-        content = response.choices[0].message.content.strip()
-        
-        # Remove markdown code blocks if present
-        if content.startswith('```'):
-            lines = content.split('\n')
-            content = '\n'.join(lines[1:-1] if lines[-1].startswith('```') else lines[1:])
-        
-        result = json.loads(content)
+        content = response.choices[0].message.content or ''
+        result = orjson.loads(content)
         
         if 'lines' not in result or not isinstance(result['lines'], list):
-            print("Invalid response structure")
+            logger.warning("Invalid response structure")
             return None
         
         # Filter out empty lines at the end
@@ -326,22 +433,20 @@ Make sure:
             lines.pop()
         
         if len(lines) < 3:
-            print("Not enough lines generated")
+            logger.warning("Not enough lines generated")
             return None
         
-        print(f"Generated {len(lines)} lines of {language} code")
+        logger.debug("Generated %d lines of %s code", len(lines), language)
         return {
             'lines': lines,
             'language': language
         }
         
-    except json.JSONDecodeError as e:
-        print(f"JSON parsing failed: {e}")
+    except orjson.JSONDecodeError as e:
+        logger.warning("JSON parsing failed: %s", e)
         return None
-    except Exception as e:
-        import traceback
-        print(f"Typing code generation failed: {e}")
-        traceback.print_exc()
+    except Exception:
+        logger.exception("Typing code generation failed")
         return None
 
 
@@ -354,10 +459,11 @@ def get_typing_code():
     data = request.get_json() or {}
     language = data.get('language', 'python').lower()
     
-    if language not in SUPPORTED_LANGUAGES:
-        return jsonify({'error': f'Unsupported language. Choose from: {SUPPORTED_LANGUAGES}'}), 400
+    if language not in SUPPORTED_LANGUAGE_SET:
+        return jsonify({'error': UNSUPPORTED_LANGUAGE_ERROR}), 400
     
-    result = generate_typing_code(language)
+    result = get_pooled(('code', language), TYPING_CODE_POOL_SIZE, TYPING_CODE_TTL,
+                        generate_typing_code, language)
     
     if not result:
         return jsonify({'error': 'Failed to generate code'}), 500
@@ -373,23 +479,42 @@ def get_typing_code():
 @jwt_required()
 def save_result():
     """Save a typing test result with weakness analysis."""
-    user_id = get_jwt_identity()
-    user = mongo.db.users.find_one({'_id': ObjectId(user_id)})
-    
-    if not user:
-        return jsonify({'error': 'User not found'}), 404
-    
+    user_id = ObjectId(get_jwt_identity())
     data = request.get_json()
     
-    required_fields = ['mode', 'wpm', 'raw_wpm', 'accuracy', 
-                      'correct_chars', 'incorrect_chars', 'test_duration']
+    if not data:
+        return jsonify({'error': 'No data provided'}), 400
     
-    for field in required_fields:
-        if field not in data:
-            return jsonify({'error': f'Missing field: {field}'}), 400
+    missing = REQUIRED_RESULT_FIELD_SET.difference(data)
+    if missing:
+        # Report the first missing field in declaration order
+        field = next(f for f in REQUIRED_RESULT_FIELDS if f in missing)
+        return jsonify({'error': f'Missing field: {field}'}), 400
+    
+    # Bump the user's counters and fetch the username in one round-trip. Only
+    # known weakness types become counter fields, so client keys can't grow
+    # the user document without bound.
+    weaknesses = data.get('weaknesses') or {}
+    if not isinstance(weaknesses, dict):
+        weaknesses = {}
+    # Non-numeric counts would make MongoDB reject the whole $inc
+    inc = {
+        f'weakness_counts.{k}': v for k, v in weaknesses.items()
+        if k in WEAKNESS_DESCRIPTIONS and isinstance(v, (int, float)) and not isinstance(v, bool)
+    }
+    inc['tests_completed'] = 1
+    user = mongo.db.users.find_one_and_update(
+        {'_id': user_id},
+        {'$inc': inc},
+        projection={'username': 1},
+        return_document=ReturnDocument.AFTER
+    )
+    
+    if not user:
+        return jsonify({'error': 'User not found'}), 404
     
     result = {
-        'user_id': ObjectId(user_id),
+        'user_id': user_id,
         'mode': data['mode'],  # 'code' or 'vim'
         'language': data.get('language', 'python'),
         'wpm': data['wpm'],
@@ -404,67 +529,97 @@ def save_result():
         'efficiency': data.get('efficiency', 100),  # Movement efficiency 0-100
         'optimal_keystrokes': data.get('optimal_keystrokes', 0),
         'actual_keystrokes': data.get('actual_keystrokes', 0),
-        'weaknesses': data.get('weaknesses', {}),  # Dict of weakness_type: count
+        'weaknesses': weaknesses,  # Dict of weakness_type: count
         'target_results': data.get('target_results', []),  # Per-target analysis
         'created_at': datetime.utcnow()
     }
     
     mongo.db.typing_results.insert_one(result)
     
-    # Update user's aggregate weakness stats
-    weaknesses = data.get('weaknesses', {})
-    if weaknesses:
-        weakness_update = {f'weakness_counts.{k}': v for k, v in weaknesses.items()}
-        mongo.db.users.update_one(
-            {'_id': ObjectId(user_id)},
-            {
-                '$inc': {**weakness_update, 'tests_completed': 1}
-            }
-        )
-    else:
-        mongo.db.users.update_one(
-            {'_id': ObjectId(user_id)},
-            {'$inc': {'tests_completed': 1}}
-        )
-    
     return jsonify({
         'message': 'Result saved successfully',
         'result': format_result(result, user['username'])
     }), 201
 
 
+def encode_results_cursor(result):
+    """Build the keyset cursor ("<created_at iso>,<_id>") for a result document."""
+    return f"{result['created_at'].isoformat()},{result['_id']}"
+
+
+def decode_results_cursor(cursor):
+    """Parse a keyset cursor back into (created_at, _id); raises ValueError if malformed."""
+    created_at, result_id = cursor.split(',', 1)
+    try:
+        return datetime.fromisoformat(created_at), ObjectId(result_id)
+    except InvalidId as e:
+        raise ValueError(str(e))
+
+
 @typing_bp.route('/results', methods=['GET'])
 @jwt_required()
 def get_results():
-    """Get user's typing test history."""
-    user_id = get_jwt_identity()
-    user = mongo.db.users.find_one({'_id': ObjectId(user_id)})
-    
-    page = request.args.get('page', 1, type=int)
-    per_page = request.args.get('per_page', 20, type=int)
+    """Get user's typing test history.
+    
+    Pages with ?page=N by default; pass the returned next_cursor as ?after=
+    to seek directly past the previous page instead of skipping rows.
+    """
+    user_id = ObjectId(get_jwt_identity())
+    username = get_jwt().get('username')
+    if username is None:
+        # Tokens issued before the username claim was added
+        user = mongo.db.users.find_one({'_id': user_id}, {'username': 1})
+        username = user['username'] if user else None
+    
+    page = max(1, request.args.get('page', 1, type=int))
+    per_page = max(1, min(MAX_RESULTS_PER_PAGE, request.args.get('per_page', 20, type=int)))
     language = request.args.get('language')
     mode = request.args.get('mode')
+    after = request.args.get('after')
     
-    query = {'user_id': ObjectId(user_id)}
+    query = {'user_id': user_id}
     
     if language:
         query['language'] = language
     if mode:
         query['mode'] = mode
     
-    total = mongo.db.typing_results.count_documents(query)
-    skip = (page - 1) * per_page
+    if after:
+        try:
+            after_created_at, after_id = decode_results_cursor(after)
+        except ValueError:
+            return jsonify({'error': 'Invalid cursor'}), 400
+        
+        query['$or'] = [
+            {'created_at': {'$lt': after_created_at}},
+            {'created_at': after_created_at, '_id': {'$lt': after_id}}
+        ]
+        results_data = list(mongo.db.typing_results.find(query, RESULT_FIELDS).sort([('created_at', -1), ('_id', -1)]).limit(per_page))
+        
+        return jsonify({
+            'results': [format_result(r, username) for r in results_data],
+            'next_cursor': encode_results_cursor(results_data[-1]) if len(results_data) == per_page else None
+        }), 200
     
-    results_data = mongo.db.typing_results.find(query).sort('created_at', -1).skip(skip).limit(per_page)
+    skip = (page - 1) * per_page
     
-    username = user['username'] if user else None
-    results = [format_result(r, username) for r in results_data]
+    # Bounded count: the (user_id, ...) indexes answer it from index keys alone,
+    # and stop after RESULTS_COUNT_CAP. The page itself reads only per_page docs.
+    total = mongo.db.typing_results.count_documents(query, limit=RESULTS_COUNT_CAP)
+    results_data = list(
+        mongo.db.typing_results.find(query, RESULT_FIELDS)
+        .sort([('created_at', -1), ('_id', -1)])
+        .skip(skip)
+        .limit(per_page)
+    )
     
     return jsonify({
-        'results': results,
+        'results': [format_result(r, username) for r in results_data],
         'total': total,
+        'total_is_estimate': total >= RESULTS_COUNT_CAP,
         'pages': (total + per_page - 1) // per_page,
-        'current_page': page
+        'current_page': page,
+        'next_cursor': encode_results_cursor(results_data[-1]) if len(results_data) == per_page else None
     }), 200
 
 
@@ -472,29 +627,43 @@ def get_results():
 @jwt_required()
 def get_stats():
     """Get user's typing statistics by language."""
-    user_id = get_jwt_identity()
-    user = mongo.db.users.find_one({'_id': ObjectId(user_id)})
+    user_id = ObjectId(get_jwt_identity())
+    user = mongo.db.users.find_one({'_id': user_id}, {'username': 1, 'tests_completed': 1})
     
     if not user:
         return jsonify({'error': 'User not found'}), 404
     
-    stats = {}
+    # One pass per language: best/avg are taken over the top 10 results by wpm
+    pipeline = [
+        {'$match': {'user_id': user_id, 'language': {'$in': SUPPORTED_LANGUAGES}}},
+        {'$group': {
+            '_id': '$language',
+            'best_wpm': {'$max': '$wpm'},
+            'tests_count': {'$sum': 1},
+            'top': {'$topN': {
+                'n': 10,
+                'sortBy': {'wpm': -1},
+                'output': {'wpm': '$wpm', 'accuracy': '$accuracy'}
+            }}
+        }},
+        {'$project': {
+            'best_wpm': 1,
+            'tests_count': 1,
+            'best_accuracy': {'$max': '$top.accuracy'},
+            'avg_wpm': {'$avg': '$top.wpm'}
+        }}
+    ]
+    grouped = {doc['_id']: doc for doc in mongo.db.typing_results.aggregate(pipeline, allowDiskUse=False)}
     
+    stats = {}
     for language in SUPPORTED_LANGUAGES:
-        results = list(mongo.db.typing_results.find({
-            'user_id': ObjectId(user_id),
-            'language': language
-        }).sort('wpm', -1).limit(10))
-        
-        if results:
+        doc = grouped.get(language)
+        if doc:
             stats[language] = {
-                'best_wpm': results[0]['wpm'],
-                'best_accuracy': max(r['accuracy'] for r in results),
-                'tests_count': mongo.db.typing_results.count_documents({
-                    'user_id': ObjectId(user_id),
-                    'language': language
-                }),
-                'avg_wpm': sum(r['wpm'] for r in results) / len(results)
+                'best_wpm': doc['best_wpm'],
+                'best_accuracy': doc['best_accuracy'],
+                'tests_count': doc['tests_count'],
+                'avg_wpm': doc['avg_wpm']
             }
     
     return jsonify({
@@ -507,12 +676,57 @@ def get_stats():
     }), 200
 
 
+# Labels and practice tips shown for each tracked Vim weakness
+WEAKNESS_DESCRIPTIONS = {
+    'slow_basic_movement': {
+        'label': 'Slow Basic Movement',
+        'tip': 'Practice h/j/k/l until they become muscle memory',
+        'practice': 'Try moving without looking at the keyboard'
+    },
+    'missing_word_motions': {
+        'label': 'Missing Word Motions',
+        'tip': "Use 'w' to jump to next word, 'b' for previous, 'e' for end of word",
+        'practice': 'Words are faster than multiple l/h presses'
+    },
+    'missing_find_motions': {
+        'label': 'Missing Find Motions',
+        'tip': "Use 'f{char}' to jump directly to a character on the line",
+        'practice': "Try 'fa' to jump to the next 'a' character"
+    },
+    'missing_line_motions': {
+        'label': 'Missing Line Motions',
+        'tip': "Use '0' for line start, '$' for end, '^' for first non-blank",
+        'practice': 'These are essential for efficient code navigation'
+    },
+    'missing_count_prefix': {
+        'label': 'Missing Count Prefixes',
+        'tip': "Use numbers before motions: '5j' moves 5 lines down",
+        'practice': 'Counting is faster than repeating motions'
+    },
+    'missing_paragraph_motions': {
+        'label': 'Missing Paragraph Motions',
+        'tip': "Use '{' and '}' to jump between blank lines/code blocks",
+        'practice': 'Great for navigating between functions'
+    },
+    'missing_bracket_matching': {
+        'label': 'Missing Bracket Matching',
+        'tip': "Use '%' to jump between matching brackets/parentheses",
+        'practice': 'Essential for code with nested structures'
+    },
+    'inefficient_path': {
+        'label': 'Inefficient Movement Path',
+        'tip': 'Plan your movement before pressing keys',
+        'practice': 'Look for the shortest path using available motions'
+    }
+}
+
+
 @typing_bp.route('/weaknesses', methods=['GET'])
 @jwt_required()
 def get_weaknesses():
     """Get user's Vim motion weaknesses and recommendations."""
-    user_id = get_jwt_identity()
-    user = mongo.db.users.find_one({'_id': ObjectId(user_id)})
+    user_id = ObjectId(get_jwt_identity())
+    user = mongo.db.users.find_one({'_id': user_id}, {'weakness_counts': 1})
     
     if not user:
         return jsonify({'error': 'User not found'}), 404
@@ -520,68 +734,46 @@ def get_weaknesses():
     # Get weakness counts from user document
     weakness_counts = user.get('weakness_counts', {})
     
-    # Get recent results with efficiency data
-    recent_results = list(mongo.db.typing_results.find({
-        'user_id': ObjectId(user_id),
-        'mode': 'vim'
-    }).sort('created_at', -1).limit(20))
-    
-    # Calculate average efficiency
-    efficiencies = [r.get('efficiency', 100) for r in recent_results if 'efficiency' in r]
-    avg_efficiency = sum(efficiencies) / len(efficiencies) if efficiencies else 100
+    # Reduce the last 20 vim results to efficiency averages in one aggregation.
+    # Missing efficiencies are kept as nulls so the 5/5 trend slices stay
+    # positional; $avg skips them.
+    pipeline = [
+        {'$match': {'user_id': user_id, 'mode': 'vim'}},
+        {'$sort': {'created_at': -1}},
+        {'$limit': 20},
+        {'$group': {
+            '_id': None,
+            'count': {'$sum': 1},
+            'efficiencies': {'$push': {'$ifNull': ['$efficiency', None]}}
+        }},
+        {'$project': {
+            'count': 1,
+            'efficiencies': 1,
+            'recent_5': {'$slice': ['$efficiencies', 5]},
+            'older_5': {'$slice': ['$efficiencies', 5, 5]}
+        }},
+        {'$project': {
+            'count': 1,
+            'avg_efficiency': {'$avg': '$efficiencies'},
+            'trend': {'$subtract': [{'$avg': '$recent_5'}, {'$avg': '$older_5'}]}
+        }}
+    ]
+    recent = next(mongo.db.typing_results.aggregate(pipeline), {})
+    total_vim_tests = recent.get('count', 0)
+    avg_efficiency = recent.get('avg_efficiency')
+    if avg_efficiency is None:
+        avg_efficiency = 100
     
     # Generate recommendations based on weakness counts
     recommendations = []
-    weakness_descriptions = {
-        'slow_basic_movement': {
-            'label': 'Slow Basic Movement',
-            'tip': 'Practice h/j/k/l until they become muscle memory',
-            'practice': 'Try moving without looking at the keyboard'
-        },
-        'missing_word_motions': {
-            'label': 'Missing Word Motions',
-            'tip': "Use 'w' to jump to next word, 'b' for previous, 'e' for end of word",
-            'practice': 'Words are faster than multiple l/h presses'
-        },
-        'missing_find_motions': {
-            'label': 'Missing Find Motions',
-            'tip': "Use 'f{char}' to jump directly to a character on the line",
-            'practice': "Try 'fa' to jump to the next 'a' character"
-        },
-        'missing_line_motions': {
-            'label': 'Missing Line Motions',
-            'tip': "Use '0' for line start, '$' for end, '^' for first non-blank",
-            'practice': 'These are essential for efficient code navigation'
-        },
-        'missing_count_prefix': {
-            'label': 'Missing Count Prefixes',
-            'tip': "Use numbers before motions: '5j' moves 5 lines down",
-            'practice': 'Counting is faster than repeating motions'
-        },
-        'missing_paragraph_motions': {
-            'label': 'Missing Paragraph Motions',
-            'tip': "Use '{' and '}' to jump between blank lines/code blocks",
-            'practice': 'Great for navigating between functions'
-        },
-        'missing_bracket_matching': {
-            'label': 'Missing Bracket Matching',
-            'tip': "Use '%' to jump between matching brackets/parentheses",
-            'practice': 'Essential for code with nested structures'
-        },
-        'inefficient_path': {
-            'label': 'Inefficient Movement Path',
-            'tip': 'Plan your movement before pressing keys',
-            'practice': 'Look for the shortest path using available motions'
-        }
-    }
     
     # Sort weaknesses by count
     sorted_weaknesses = sorted(weakness_counts.items(), key=lambda x: x[1], reverse=True)
     
     weakness_details = []
     for weakness_type, count in sorted_weaknesses:
-        if count > 0 and weakness_type in weakness_descriptions:
-            desc = weakness_descriptions[weakness_type]
+        if count > 0 and weakness_type in WEAKNESS_DESCRIPTIONS:
+            desc = WEAKNESS_DESCRIPTIONS[weakness_type]
             weakness_details.append({
                 'type': weakness_type,
                 'count': count,
@@ -593,20 +785,14 @@ def get_weaknesses():
             if len(recommendations) < 3:
                 recommendations.append(desc['tip'])
     
-    # Get improvement trend
-    if len(recent_results) >= 5:
-        recent_5 = [r.get('efficiency', 100) for r in recent_results[:5] if 'efficiency' in r]
-        older_5 = [r.get('efficiency', 100) for r in recent_results[5:10] if 'efficiency' in r]
-        if recent_5 and older_5:
-            trend = sum(recent_5) / len(recent_5) - sum(older_5) / len(older_5)
-        else:
-            trend = 0
-    else:
+    # Improvement trend (null when either 5-test window has no efficiency data)
+    trend = recent.get('trend')
+    if total_vim_tests < 5 or trend is None:
         trend = 0
     
     return jsonify({
         'avg_efficiency': round(avg_efficiency, 1),
-        'total_vim_tests': len(recent_results),
+        'total_vim_tests': total_vim_tests,
         'trend': round(trend, 1),  # Positive = improving
         'weaknesses': weakness_details,
         'recommendations': recommendations,
@@ -614,16 +800,18 @@ def get_weaknesses():
     }), 200
 
 
+def analytics_field_key(key):
+    """Escape a client-supplied pair/word/type for use in a field path; None if unusable."""
+    if not isinstance(key, str) or not key or '\0' in key:
+        return None
+    return key.translate(FIELD_KEY_ESCAPES)
+
+
 @typing_bp.route('/typing-analytics', methods=['POST'])
 @jwt_required()
 def save_typing_analytics():
     """Save typing test result with detailed analytics."""
-    user_id = get_jwt_identity()
-    user = mongo.db.users.find_one({'_id': ObjectId(user_id)})
-    
-    if not user:
-        return jsonify({'error': 'User not found'}), 404
-    
+    user_id = ObjectId(get_jwt_identity())
     data = request.get_json()
     
     if not data:
@@ -631,7 +819,7 @@ def save_typing_analytics():
     
     # Save the typing test result
     result = {
-        'user_id': ObjectId(user_id),
+        'user_id': user_id,
         'mode': 'typing',
         'test_mode': data.get('test_mode', 'words'),  # 'words' or 'code'
         'language': data.get('language'),  # Only for code mode
@@ -646,60 +834,44 @@ def save_typing_analytics():
         'created_at': datetime.utcnow()
     }
     
-    mongo.db.typing_results.insert_one(result)
+    # Insert first so the result is kept even if the counter update fails
+    inserted = mongo.db.typing_results.insert_one(result)
     
-    # Update user's aggregate typing analytics
+    # Fold every aggregate counter into one $inc so the whole update is a single
+    # write. Its matched count doubles as the user existence check.
     analytics = data.get('analytics', {})
+    # A Counter sums repeats of the same pair/word/transition within one payload
+    inc = Counter({'typing_tests_completed': 1})
     
-    # Update problem character pairs
+    # Problem character pairs
     for pair_data in analytics.get('problem_character_pairs', []):
-        pair = pair_data.get('pair', '')
+        pair = analytics_field_key(pair_data.get('pair'))
         if pair:
-            mongo.db.users.update_one(
-                {'_id': ObjectId(user_id)},
-                {
-                    '$inc': {
-                        f'typing_analytics.character_pairs.{pair}.total_ms': pair_data.get('avg_ms', 0),
-                        f'typing_analytics.character_pairs.{pair}.count': 1,
-                        f'typing_analytics.character_pairs.{pair}.errors': pair_data.get('errors', 0),
-                    }
-                }
-            )
+            inc[f'typing_analytics.character_pairs.{pair}.total_ms'] += pair_data.get('avg_ms', 0)
+            inc[f'typing_analytics.character_pairs.{pair}.count'] += 1
+            inc[f'typing_analytics.character_pairs.{pair}.errors'] += pair_data.get('errors', 0)
     
-    # Update problem words
+    # Problem words
     for word_data in analytics.get('problem_words', []):
-        word = word_data.get('word', '')
+        word = analytics_field_key(word_data.get('word'))
         if word:
-            mongo.db.users.update_one(
-                {'_id': ObjectId(user_id)},
-                {
-                    '$inc': {
-                        f'typing_analytics.problem_words.{word}.attempts': word_data.get('attempts', 0),
-                        f'typing_analytics.problem_words.{word}.errors': word_data.get('errors', 0),
-                    }
-                }
-            )
+            inc[f'typing_analytics.problem_words.{word}.attempts'] += word_data.get('attempts', 0)
+            inc[f'typing_analytics.problem_words.{word}.errors'] += word_data.get('errors', 0)
     
-    # Update finger transition stats
+    # Finger transition stats
     for transition in analytics.get('difficult_finger_transitions', []):
-        t_type = transition.get('type', '')
+        t_type = analytics_field_key(transition.get('type'))
         if t_type:
-            mongo.db.users.update_one(
-                {'_id': ObjectId(user_id)},
-                {
-                    '$inc': {
-                        f'typing_analytics.finger_transitions.{t_type}.total_ms': transition.get('avg_ms', 0),
-                        f'typing_analytics.finger_transitions.{t_type}.count': 1,
-                        f'typing_analytics.finger_transitions.{t_type}.errors': transition.get('errors', 0),
-                    }
-                }
-            )
+            inc[f'typing_analytics.finger_transitions.{t_type}.total_ms'] += transition.get('avg_ms', 0)
+            inc[f'typing_analytics.finger_transitions.{t_type}.count'] += 1
+            inc[f'typing_analytics.finger_transitions.{t_type}.errors'] += transition.get('errors', 0)
     
-    # Increment tests count
-    mongo.db.users.update_one(
-        {'_id': ObjectId(user_id)},
-        {'$inc': {'typing_tests_completed': 1}}
-    )
+    updated = mongo.db.users.update_one({'_id': user_id}, {'$inc': dict(inc)})
+    
+    if not updated.matched_count:
+        # Don't leave a result behind for a user that no longer exists
+        mongo.db.typing_results.delete_one({'_id': inserted.inserted_id})
+        return jsonify({'error': 'User not found'}), 404
     
     return jsonify({
         'message': 'Analytics saved successfully',
@@ -708,16 +880,48 @@ def save_typing_analytics():
     }), 201
 
 
+def format_mode_stats(grouped):
+    """Shape a per-mode $group result (empty list when there are no tests) for the API."""
+    if not grouped:
+        return {'tests_completed': 0, 'best_wpm': 0, 'avg_accuracy': 0}
+    stats = grouped[0]
+    return {
+        'tests_completed': stats['tests_completed'],
+        'best_wpm': stats['best_wpm'] or 0,
+        'avg_accuracy': round(stats['avg_accuracy'])
+    }
+
+
 @typing_bp.route('/typing-analytics', methods=['GET'])
 @jwt_required()
 def get_typing_analytics():
     """Get user's aggregated typing analytics."""
-    user_id = get_jwt_identity()
-    user = mongo.db.users.find_one({'_id': ObjectId(user_id)})
+    user_id = ObjectId(get_jwt_identity())
+    # Cheap probe first: the unbounded typing_analytics map is only fetched
+    # when the client's copy is stale
+    user = mongo.db.users.find_one({'_id': user_id}, {'typing_tests_completed': 1})
     
     if not user:
         return jsonify({'error': 'User not found'}), 404
     
+    # Everything below derives from the analytics counters and the typing results;
+    # every save bumps typing_tests_completed or adds a newer result, so the pair
+    # identifies this response and unchanged data can be answered with a 304
+    latest = mongo.db.typing_results.find_one(
+        {'user_id': user_id, 'mode': 'typing'},
+        {'_id': 1},
+        sort=[('created_at', -1), ('_id', -1)]
+    )
+    etag = f"{user.get('typing_tests_completed', 0)}-{latest['_id'] if latest else 0}"
+    if request.if_none_match.contains(etag):
+        return '', 304, {'ETag': f'"{etag}"'}
+    
+    # A save landing between the two reads only makes the ETag older than the
+    # body, so the next request refetches rather than keeping stale data
+    user = mongo.db.users.find_one(
+        {'_id': user_id},
+        {'typing_analytics': 1, 'typing_tests_completed': 1}
+    ) or user
     typing_analytics = user.get('typing_analytics', {})
     
     # Format character pairs
@@ -726,7 +930,7 @@ def get_typing_analytics():
     for pair, stats in char_pairs.items():
         if stats.get('count', 0) > 0:
             problem_pairs.append({
-                'pair': pair,
+                'pair': pair.translate(FIELD_KEY_UNESCAPES),
                 'avg_ms': round(stats.get('total_ms', 0) / stats.get('count', 1)),
                 'errors': stats.get('errors', 0),
                 'count': stats.get('count', 0)
@@ -739,7 +943,7 @@ def get_typing_analytics():
     for word, stats in words.items():
         if stats.get('attempts', 0) > 0:
             problem_words.append({
-                'word': word,
+                'word': word.translate(FIELD_KEY_UNESCAPES),
                 'attempts': stats.get('attempts', 0),
                 'errors': stats.get('errors', 0),
                 'error_rate': round(stats.get('errors', 0) / stats.get('attempts', 1) * 100)
@@ -753,90 +957,56 @@ def get_typing_analytics():
         if stats.get('count', 0) > 0:
             error_rate = stats.get('errors', 0) / stats.get('count', 1)
             finger_transitions.append({
-                'type': t_type,
+                'type': t_type.translate(FIELD_KEY_UNESCAPES),
                 'avg_ms': round(stats.get('total_ms', 0) / stats.get('count', 1)),
                 'errors': stats.get('errors', 0),
                 'severity': 'high' if error_rate > 0.1 else 'medium' if error_rate > 0.05 else 'low'
             })
     
-    # Get recent test history for words mode
-    words_tests = list(mongo.db.typing_results.find({
-        'user_id': ObjectId(user_id),
-        'mode': 'typing',
-        '$or': [
-            {'test_mode': 'words'},
-            {'test_mode': {'$exists': False}}  # Legacy tests without test_mode
-        ]
-    }).sort('created_at', -1).limit(10))
-    
-    # Get total count for words mode
-    words_count = mongo.db.typing_results.count_documents({
-        'user_id': ObjectId(user_id),
-        'mode': 'typing',
-        '$or': [
-            {'test_mode': 'words'},
-            {'test_mode': {'$exists': False}}
-        ]
-    })
-    
-    # Get all words tests for best WPM calculation
-    all_words_tests = list(mongo.db.typing_results.find({
-        'user_id': ObjectId(user_id),
-        'mode': 'typing',
-        '$or': [
-            {'test_mode': 'words'},
-            {'test_mode': {'$exists': False}}
-        ]
-    }, {'wpm': 1, 'accuracy': 1}))
+    # Recent history, counts and per-mode stats in one round-trip. Sorting
+    # before $facet lets the (user_id, mode, created_at) index order the rows.
+    words_match = {'$or': [
+        {'test_mode': 'words'},
+        {'test_mode': {'$exists': False}}  # Legacy tests without test_mode
+    ]}
+    code_match = {'test_mode': 'code'}
+    history_fields = {'_id': 0, 'wpm': 1, 'accuracy': 1, 'language': 1, 'created_at': 1}
+    stats_group = {
+        '_id': None,
+        'tests_completed': {'$sum': 1},
+        'best_wpm': {'$max': '$wpm'},
+        'avg_accuracy': {'$avg': {'$ifNull': ['$accuracy', 0]}}
+    }
+    pipeline = [
+        {'$match': {'user_id': user_id, 'mode': 'typing'}},
+        {'$sort': {'created_at': -1}},
+        {'$facet': {
+            'words_history': [{'$match': words_match}, {'$limit': 10}, {'$project': history_fields}],
+            'words_stats': [{'$match': words_match}, {'$group': stats_group}],
+            'code_history': [{'$match': code_match}, {'$limit': 10}, {'$project': history_fields}],
+            'code_stats': [{'$match': code_match}, {'$group': stats_group}]
+        }}
+    ]
+    facets = next(mongo.db.typing_results.aggregate(pipeline, allowDiskUse=False))
     
     words_history = [{
         'wpm': t.get('wpm', 0),
         'accuracy': t.get('accuracy', 0),
         'date': t.get('created_at').isoformat() if t.get('created_at') else None
-    } for t in words_tests]
-    
-    # Get recent test history for code mode
-    code_tests = list(mongo.db.typing_results.find({
-        'user_id': ObjectId(user_id),
-        'mode': 'typing',
-        'test_mode': 'code'
-    }).sort('created_at', -1).limit(10))
-    
-    # Get total count for code mode
-    code_count = mongo.db.typing_results.count_documents({
-        'user_id': ObjectId(user_id),
-        'mode': 'typing',
-        'test_mode': 'code'
-    })
-    
-    # Get all code tests for best WPM calculation
-    all_code_tests = list(mongo.db.typing_results.find({
-        'user_id': ObjectId(user_id),
-        'mode': 'typing',
-        'test_mode': 'code'
-    }, {'wpm': 1, 'accuracy': 1, 'language': 1}))
+    } for t in facets['words_history']]
     
     code_history = [{
         'wpm': t.get('wpm', 0),
         'accuracy': t.get('accuracy', 0),
         'language': t.get('language', 'unknown'),
         'date': t.get('created_at').isoformat() if t.get('created_at') else None
-    } for t in code_tests]
+    } for t in facets['code_history']]
     
     # Calculate separate stats for words and code modes
-    words_stats = {
-        'tests_completed': words_count,
-        'best_wpm': max([t.get('wpm', 0) for t in all_words_tests], default=0),
-        'avg_accuracy': round(sum([t.get('accuracy', 0) for t in all_words_tests]) / len(all_words_tests)) if all_words_tests else 0,
-    }
-    
-    code_stats = {
-        'tests_completed': code_count,
-        'best_wpm': max([t.get('wpm', 0) for t in all_code_tests], default=0),
-        'avg_accuracy': round(sum([t.get('accuracy', 0) for t in all_code_tests]) / len(all_code_tests)) if all_code_tests else 0,
-    }
+    words_stats = format_mode_stats(facets['words_stats'])
+    code_stats = format_mode_stats(facets['code_stats'])
     
-    return jsonify({
+    response = jsonify({
         'problem_character_pairs': problem_pairs[:10],
         'problem_words': problem_words[:10],
         'difficult_finger_transitions': finger_transitions,
@@ -851,7 +1021,12 @@ def get_typing_analytics():
         },
         # Keep legacy history for backward compatibility
         'history': words_history + code_history,
-    }), 200
+    })
+    response.set_etag(etag)
+    # Per-user data: let the browser keep it, but revalidate on every load
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response, 200
 
 
 # Gumloop API configuration
@@ -859,14 +1034,28 @@ GUMLOOP_API_KEY = os.environ.get('GUMLOOP_API_KEY', '19f2a2bb2667423aa2d8c1306e3
 GUMLOOP_FLOW_ID = os.environ.get('GUMLOOP_FLOW_ID', 'sPQhausL3s1SU4SjjHsCaS')
 GUMLOOP_USER_ID = os.environ.get('GUMLOOP_USER_ID', 'o2guyeN2soU42AV1oD38pySunWJ3')
 
+# Run status polling: capped exponential backoff within an overall deadline
+GUMLOOP_POLL_TIMEOUT = 30  # seconds
+GUMLOOP_POLL_INITIAL_DELAY = 0.25  # seconds
+GUMLOOP_POLL_MAX_DELAY = 4.0  # seconds
+GUMLOOP_REQUEST_TIMEOUT = 10  # seconds, per HTTP call; also capped by the overall deadline
+
+# Shared session so the start call and status polls reuse keep-alive connections
+_gumloop_session = requests.Session()
+_gumloop_session.headers['Authorization'] = f'Bearer {GUMLOOP_API_KEY}'
+_gumloop_session.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=8))
+
+# Finished practice texts keyed by a hash of the analytics input, so repeat
+# requests for the same weakness profile skip the pipeline
+PRACTICE_TEXT_TTL = 300  # seconds
+PRACTICE_TEXT_CACHE_SIZE = 512
+_practice_text_cache = {}
+
 
 @typing_bp.route('/generate-practice-text', methods=['POST'])
 @jwt_required()
 def generate_practice_text():
     """Generate personalized practice text based on user weaknesses using Gumloop."""
-    import requests
-    import time
-    
     data = request.get_json()
     
     if not data:
@@ -878,29 +1067,35 @@ def generate_practice_text():
         'problem_words': data.get('problem_words', []),
         'difficult_finger_transitions': data.get('difficult_finger_transitions', [])
     }
+    analytics_json = orjson.dumps(analytics_input, option=orjson.OPT_SORT_KEYS)
+    
+    cache_key = hashlib.sha1(analytics_json).digest()
+    cached = _practice_text_cache.get(cache_key)
+    if cached and time.monotonic() - cached[0] < PRACTICE_TEXT_TTL:
+        return jsonify(cached[1]), 200
+    
+    # Bounds the whole exchange, including any single hung HTTP call
+    deadline = time.monotonic() + GUMLOOP_POLL_TIMEOUT
     
     try:
         # Start the Gumloop pipeline
-        start_response = requests.post(
+        start_response = _gumloop_session.post(
             'https://api.gumloop.com/api/v1/start_pipeline',
-            headers={
-                'Authorization': f'Bearer {GUMLOOP_API_KEY}',
-                'Content-Type': 'application/json'
-            },
             json={
                 'user_id': GUMLOOP_USER_ID,
                 'saved_item_id': GUMLOOP_FLOW_ID,
                 'pipeline_inputs': [
                     {
                         'input_name': 'analytics_json',
-                        'value': str(analytics_input)
+                        'value': analytics_json.decode('utf-8')
                     }
                 ]
-            }
+            },
+            timeout=min(GUMLOOP_REQUEST_TIMEOUT, deadline - time.monotonic())
         )
         
         if start_response.status_code != 200:
-            print(f"Gumloop start error: {start_response.text}")
+            logger.error("Gumloop start error: %s", start_response.text)
             return jsonify({'error': 'Failed to start practice text generation'}), 500
         
         run_data = start_response.json()
@@ -909,21 +1104,30 @@ def generate_practice_text():
         if not run_id:
             return jsonify({'error': 'No run ID returned from Gumloop'}), 500
         
-        # Poll for completion (max 30 seconds)
-        max_attempts = 30
-        for attempt in range(max_attempts):
-            time.sleep(1)
+        # Poll for completion; short runs are seen quickly and long ones
+        # aren't polled every second
+        delay = GUMLOOP_POLL_INITIAL_DELAY
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            time.sleep(min(delay, remaining))
+            delay = min(delay * 2, GUMLOOP_POLL_MAX_DELAY)
             
-            status_response = requests.get(
-                f'https://api.gumloop.com/api/v1/get_pl_run',
-                headers={
-                    'Authorization': f'Bearer {GUMLOOP_API_KEY}'
-                },
-                params={
-                    'run_id': run_id,
-                    'user_id': GUMLOOP_USER_ID
-                }
-            )
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                status_response = _gumloop_session.get(
+                    'https://api.gumloop.com/api/v1/get_pl_run',
+                    params={
+                        'run_id': run_id,
+                        'user_id': GUMLOOP_USER_ID
+                    },
+                    timeout=min(GUMLOOP_REQUEST_TIMEOUT, remaining)
+                )
+            except requests.Timeout:
+                continue
             
             if status_response.status_code != 200:
                 continue
@@ -938,12 +1142,16 @@ def generate_practice_text():
                 
                 if practice_text:
                     # Split into words for the typing test
-                    words = practice_text.split()
-                    return jsonify({
+                    result = {
                         'success': True,
                         'practice_text': practice_text,
-                        'words': words
-                    }), 200
+                        'words': practice_text.split()
+                    }
+                    if cache_key not in _practice_text_cache and len(_practice_text_cache) >= PRACTICE_TEXT_CACHE_SIZE:
+                        # Evict the oldest entry (dicts keep insertion order)
+                        _practice_text_cache.pop(next(iter(_practice_text_cache)))
+                    _practice_text_cache[cache_key] = (time.monotonic(), result)
+                    return jsonify(result), 200
                 else:
                     return jsonify({'error': 'No practice text generated'}), 500
             
@@ -952,9 +1160,10 @@ def generate_practice_text():
         
         return jsonify({'error': 'Timeout waiting for practice text generation'}), 504
         
+    except requests.Timeout:
+        logger.warning("Gumloop start request timed out")
+        return jsonify({'error': 'Timeout waiting for practice text generation'}), 504
     except Exception as e:
-        import traceback
-        print(f"Gumloop API error: {e}")
-        traceback.print_exc()
+        logger.exception("Gumloop API error")
         return jsonify({'error': str(e)}), 500
 
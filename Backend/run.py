@@ -1,4 +1,5 @@
 from app import create_app, mongo
+from pymongo import IndexModel
 
 app = create_app()
 
@@ -7,18 +8,30 @@ app = create_app()
 def init_db():
     """Initialize database indexes."""
     with app.app_context():
-        mongo.db.users.create_index('username', unique=True)
-        mongo.db.users.create_index('email', unique=True)
-        mongo.db.typing_results.create_index('user_id')
-        mongo.db.typing_results.create_index('created_at')
-        mongo.db.typing_results.create_index([('mode', 1), ('mode_value', 1)])
+        mongo.db.users.create_indexes([
+            IndexModel('username', unique=True),
+            IndexModel('email', unique=True)
+        ])
+        mongo.db.typing_results.create_indexes([
+            IndexModel('created_at'),
+            IndexModel([('user_id', 1), ('created_at', -1), ('_id', -1)]),
+            IndexModel([('user_id', 1), ('language', 1), ('wpm', -1)]),
+            IndexModel([('user_id', 1), ('mode', 1), ('created_at', -1), ('_id', -1)]),
+            IndexModel([('user_id', 1), ('language', 1), ('created_at', -1), ('_id', -1)])
+        ])
+        # Superseded indexes: user_id-only queries are served by the (user_id, ...)
+        # compounds, and nothing queries by mode_value (save_result never writes it)
+        existing = mongo.db.typing_results.index_information()
+        for name in ('user_id_1', 'mode_1_mode_value_1'):
+            if name in existing:
+                mongo.db.typing_results.drop_index(name)
         print('Database indexes created!')
 
 
 @app.cli.command('seed-db')
 def seed_db():
     """Seed the database with sample data."""
-    from app import bcrypt
+    from utils.passwords import hash_password
     from datetime import datetime
     
     with app.app_context():
@@ -26,7 +39,7 @@ def seed_db():
             user = {
                 'username': 'testuser',
                 'email': 'test@example.com',
-                'password_hash': bcrypt.generate_password_hash('password123').decode('utf-8'),
+                'password_hash': hash_password('password123'),
                 'created_at': datetime.utcnow(),
                 'tests_completed': 0,
                 'tests_started': 0
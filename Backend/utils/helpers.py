@@ -1,17 +1,33 @@
+# Fields read by format_user; pass as a projection to skip password_hash etc.
+USER_FIELDS = {'username': 1, 'email': 1, 'created_at': 1, 'tests_completed': 1, 'tests_started': 1}
+
+
 def format_user(user):
-    """Format user document for API response."""
+    """Format user document for API response.
+    
+    Datetimes are left as-is; the orjson JSON provider writes them in ISO 8601.
+    """
     return {
         'id': str(user['_id']),
         'username': user['username'],
         'email': user['email'],
-        'created_at': user['created_at'].isoformat(),
+        'created_at': user['created_at'],
         'tests_completed': user.get('tests_completed', 0),
         'tests_started': user.get('tests_started', 0)
     }
 
 
+# Fields read by format_result across typing and vim/code results
+RESULT_FIELDS = {
+    'user_id': 1, 'mode': 1, 'language': 1, 'wpm': 1, 'raw_wpm': 1, 'accuracy': 1,
+    'created_at': 1, 'time_limit': 1, 'keystrokes': 1, 'correct_keystrokes': 1,
+    'words_typed': 1, 'correct_chars': 1, 'incorrect_chars': 1, 'extra_chars': 1,
+    'missed_chars': 1, 'test_duration': 1, 'lines_completed': 1
+}
+
+
 def format_result(result, username=None):
-    """Format typing result document for API response."""
+    """Format typing result document for API response (datetimes serialized by orjson)."""
     # Handle both vim/code mode and typing mode
     mode = result.get('mode', 'typing')
     
@@ -24,7 +40,7 @@ def format_result(result, username=None):
         'wpm': round(result.get('wpm', 0), 2),
         'raw_wpm': round(result.get('raw_wpm', 0), 2),
         'accuracy': round(result.get('accuracy', 0), 2),
-        'created_at': result['created_at'].isoformat() if result.get('created_at') else None
+        'created_at': result.get('created_at')
     }
     
     # Add mode-specific fields
@@ -52,3 +68,14 @@ def format_result(result, username=None):
         })
     
     return base
+
+
+def run_blocking(func, *args):
+    """Run a CPU-bound call on a native thread when serving under gevent."""
+    try:
+        from gevent import get_hub, monkey
+    except ImportError:
+        return func(*args)
+    if not monkey.is_module_patched('threading'):
+        return func(*args)
+    return get_hub().threadpool.apply(func, args)
@@ -0,0 +1,47 @@
+from argon2 import PasswordHasher
+from argon2.exceptions import InvalidHashError, VerificationError
+from app import bcrypt
+
+# Built from the app's ARGON2_* settings by init_password_hasher (called in
+# create_app); module-level so hashing also works on run_blocking's threads,
+# which have no app context
+_hasher = None
+
+# Verified against when a login names an unknown user, so that path costs the
+# same as a wrong password and response times don't reveal which usernames exist
+_dummy_password_hash = None
+
+
+def init_password_hasher(app):
+    """Configure Argon2 from app.config."""
+    global _hasher, _dummy_password_hash
+    _hasher = PasswordHasher(
+        time_cost=app.config['ARGON2_TIME_COST'],
+        memory_cost=app.config['ARGON2_MEMORY_COST'],
+        parallelism=app.config['ARGON2_PARALLELISM']
+    )
+    _dummy_password_hash = _hasher.hash('unknown-user-placeholder')
+
+
+def dummy_password_hash():
+    """Hash to verify against when the user doesn't exist."""
+    return _dummy_password_hash
+
+
+def hash_password(password):
+    """Hash a password with Argon2id."""
+    return _hasher.hash(password)
+
+
+def verify_password(password_hash, password):
+    """Check a password against an Argon2id or legacy bcrypt hash.
+    
+    Returns (valid, needs_rehash); legacy bcrypt hashes always need a rehash.
+    """
+    if password_hash.startswith('$2'):
+        return bcrypt.check_password_hash(password_hash, password), True
+    try:
+        _hasher.verify(password_hash, password)
+    except (VerificationError, InvalidHashError):
+        return False, False
+    return True, _hasher.check_needs_rehash(password_hash)
@@ -0,0 +1,7 @@
+# Patch the stdlib before pymongo/flask are imported so socket waits yield
+from gevent import monkey
+monkey.patch_all()
+
+from app import create_app
+
+app = create_app()